@@ -0,0 +1,88 @@
+"""
+Certificate Helpers
+-------------------
+TLS/SSL helpers shared by the MQTT publisher and subscriber.
+"""
+
+import functools
+import logging
+import os
+import ssl
+import stat
+
+logger = logging.getLogger("MQTT-Certs")
+
+
+def _is_readable(path, st, euid):
+    """Decide from stat results whether the current user can read a file.
+
+    Falls back to os.access() only when the permission bits alone do not
+    settle it, e.g. group-only access or ACLs.
+    """
+    if euid == 0:
+        return True
+    if st.st_uid == euid:
+        return bool(st.st_mode & stat.S_IRUSR)
+    if st.st_mode & stat.S_IRGRP and st.st_mode & stat.S_IROTH:
+        return True
+    return os.access(path, os.R_OK)
+
+
+def check_cert_files(*paths):
+    """Check if certificate files exist and are readable."""
+    # Windows has no effective UID, so readability always goes via os.access()
+    euid = os.geteuid() if hasattr(os, "geteuid") else None
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
+            logger.error(f"Certificate file not found: {path}")
+            return False
+        if euid is None:
+            readable = os.access(path, os.R_OK)
+        else:
+            readable = _is_readable(path, st, euid)
+        if not readable:
+            logger.error(f"Certificate file not readable: {path}")
+            return False
+    return True
+
+
+class _ResumingSSLContext(ssl.SSLContext):
+    """SSL context that offers the last remembered TLS session on new sockets."""
+
+    session = None
+
+    def wrap_socket(self, sock, *args, session=None, **kwargs):
+        if session is None:
+            session = self.session
+        return super().wrap_socket(sock, *args, session=session, **kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def build_ssl_context(ca_cert, client_cert, client_key):
+    """Build a TLS/SSL context for certificate authentication.
+
+    The context is cached per certificate set, so the certificates and key
+    are only parsed once per process and reused across reconnects.
+    """
+    context = _ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    # TLS 1.3 only offers AEAD cipher suites (AES-GCM and ChaCha20-Poly1305),
+    # so there is nothing weaker left to exclude with set_ciphers()
+    context.minimum_version = ssl.TLSVersion.TLSv1_3
+    # Accept session tickets so reconnects can resume instead of doing a
+    # full handshake
+    context.options &= ~ssl.OP_NO_TICKET
+    context.load_verify_locations(cafile=ca_cert)
+    context.load_cert_chain(client_cert, client_key)
+    return context
+
+
+def remember_tls_session(client):
+    """Keep the client's current TLS session so the next connect resumes it."""
+    sock = client.socket()
+    session = getattr(sock, "session", None)
+    if session is not None and session.has_ticket:
+        sock.context.session = session
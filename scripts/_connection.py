@@ -0,0 +1,33 @@
+"""
+Connection Helpers
+------------------
+Client IDs and socket settings shared by the MQTT publisher, subscribers
+and loopback test.
+"""
+
+import os
+import socket
+import time
+
+# Disable Nagle's algorithm so small publishes and acknowledgements are sent
+# immediately. Buffer sizes are left to the kernel: paho only hands over the
+# socket after connecting, too late for SO_RCVBUF to affect the TCP window
+# scale, and pinning either buffer turns off Linux autotuning. TCP_QUICKACK
+# is not set either, since Linux clears it again on its own
+SOCKET_OPTIONS = ((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),)
+
+
+def on_socket_open(client, userdata, sock):
+    """Callback when the network socket is opened, before the MQTT handshake."""
+    for option in SOCKET_OPTIONS:
+        sock.setsockopt(*option)
+
+
+def make_client_id(prefix, idx=None):
+    """Build a client ID that is unique per process and connection.
+
+    Uses the process ID and the clock rather than random, so no PRNG has to
+    be seeded at startup.
+    """
+    name = f"kobayashi-{prefix}" if idx is None else f"kobayashi-{prefix}-{idx}"
+    return f"{name}-{os.getpid():x}-{time.time_ns() & 0xFFFF:x}"
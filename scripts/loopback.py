@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+MQTT Loopback Test with TLS/SSL Certificate Authentication
+----------------------------------------------------------
+Publishes sample messages and receives them back over a single client
+connection, to check the end-to-end path and measure latency without
+running the publisher and subscriber as separate processes.
+"""
+
+import argparse
+import functools
+import itertools
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import orjson
+
+import subscriber
+from _connection import make_client_id, on_socket_open
+from publisher import create_sample_message, next_deadline, sleep_until
+
+logger = logging.getLogger("MQTT-Loopback")
+
+# Default MQTT broker settings
+DEFAULT_BROKER = "localhost"
+DEFAULT_PORT = 8883  # Standard MQTT TLS port
+DEFAULT_TOPIC = "kobayashi/signals/loopback"
+DEFAULT_INTERVAL = 0.1  # seconds
+DEFAULT_COUNT = 100
+DEFAULT_LOG_EVERY = 10
+DEFAULT_TIMEOUT = 10  # seconds
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Loopback settings parsed from the command line."""
+
+    broker: str
+    port: int
+    topic: str
+    interval: float
+    count: int
+    log_every: int
+    timeout: float
+    ca_cert: str
+    cert: str
+    key: str
+    debug: bool
+
+
+@functools.lru_cache(maxsize=1)
+def _parser():
+    """Build the command line parser."""
+    parser = argparse.ArgumentParser(description="MQTT Loopback Test with TLS/SSL")
+    parser.add_argument(
+        "--broker",
+        default=DEFAULT_BROKER,
+        help=f"MQTT broker address (default: {DEFAULT_BROKER})",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_PORT,
+        help=f"MQTT broker port (default: {DEFAULT_PORT})",
+    )
+    parser.add_argument(
+        "--topic",
+        default=DEFAULT_TOPIC,
+        help=f"MQTT topic to publish to and subscribe to (default: {DEFAULT_TOPIC})",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help=f"Publish interval in seconds (default: {DEFAULT_INTERVAL})",
+    )
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=DEFAULT_COUNT,
+        help=f"Number of messages to send (default: {DEFAULT_COUNT})",
+    )
+    parser.add_argument(
+        "--log-every",
+        type=int,
+        default=DEFAULT_LOG_EVERY,
+        help=f"Log every Nth received message (default: {DEFAULT_LOG_EVERY})",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help=(
+            "Seconds to wait for the subscription and for outstanding messages "
+            f"(default: {DEFAULT_TIMEOUT})"
+        ),
+    )
+    parser.add_argument(
+        "--ca-cert",
+        default=os.path.join("certs", "ca", "ca.crt"),
+        help="Path to CA certificate file",
+    )
+    parser.add_argument(
+        "--cert",
+        default=os.path.join("certs", "clients", "publisher.crt"),
+        help="Path to client certificate file",
+    )
+    parser.add_argument(
+        "--key",
+        default=os.path.join("certs", "clients", "publisher.key"),
+        help="Path to client key file",
+    )
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+
+    return parser
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    return Config(**vars(_parser().parse_args()))
+
+
+def on_connect(client, userdata, flags, reason_code, properties=None):
+    """Callback when the client connects to the broker."""
+    if reason_code == 0:
+        from _certs import remember_tls_session
+
+        logger.info(f"Connected to MQTT Broker: {userdata['broker']} using TLS/SSL")
+        remember_tls_session(client)
+        client.subscribe(userdata["topic"], qos=1)
+    else:
+        logger.error(f"Failed to connect, return code: {reason_code}")
+
+
+def on_subscribe(client, userdata, mid, reason_code_list=None, properties=None):
+    """Callback when client subscribes to a topic."""
+    if subscriber.on_subscribe(client, userdata, mid, reason_code_list, properties):
+        logger.info(f"Subscribed to topic: {userdata['topic']}")
+    else:
+        userdata["subscribe_failed"] = True
+    userdata["subscribed"].set()
+
+
+def on_message(client, userdata, msg):
+    """Callback when a message is received."""
+    subscriber.process_message(msg.topic, msg.payload, userdata)
+
+    userdata["delivered"] += 1
+    if userdata["delivered"] >= userdata["count"]:
+        userdata["done"].set()
+
+
+def main():
+    """Main function."""
+    import paho.mqtt.client as mqtt
+
+    from _certs import build_ssl_context, check_cert_files
+
+    args = parse_arguments()
+
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        subscriber.logger.setLevel(logging.DEBUG)
+
+    if not check_cert_files(args.ca_cert, args.cert, args.key):
+        return 1
+
+    if args.count < 1:
+        logger.error(f"Message count must be at least 1, got: {args.count}")
+        return 1
+
+    if args.log_every < 1:
+        logger.error(f"Log interval must be at least 1, got: {args.log_every}")
+        return 1
+
+    client_id = make_client_id("loopback")
+
+    userdata = {
+        "topic": args.topic,
+        "broker": args.broker,
+        "count": args.count,
+        "log_every": args.log_every,
+        "received": itertools.count(1),
+        "red": itertools.count(1),
+        "delivered": 0,
+        "subscribed": threading.Event(),
+        "subscribe_failed": False,
+        "done": threading.Event(),
+    }
+
+    # One client both publishes and subscribes, so the whole round trip
+    # shares a single TLS connection
+    client = mqtt.Client(
+        client_id=client_id,
+        callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+        userdata=userdata,
+    )
+
+    # Set callbacks
+    client.on_connect = on_connect
+    client.on_subscribe = on_subscribe
+    client.on_message = on_message
+    client.on_socket_open = on_socket_open
+
+    logger.info("Setting up TLS/SSL with certificate authentication")
+    try:
+        client.tls_set_context(build_ssl_context(args.ca_cert, args.cert, args.key))
+    except Exception as e:
+        logger.error(f"Failed to set up TLS: {e}")
+        return 1
+
+    logger.info(f"Connecting to secure broker {args.broker}:{args.port}...")
+    try:
+        client.connect(args.broker, args.port)
+    except Exception as e:
+        logger.error(f"Connection failed: {e}")
+        return 1
+
+    client.loop_start()
+
+    try:
+        if not userdata["subscribed"].wait(args.timeout):
+            logger.error(f"Not subscribed after {args.timeout} seconds")
+            return 1
+        if userdata["subscribe_failed"]:
+            return 1
+
+        next_tick = time.monotonic()
+        for message_count in range(1, args.count + 1):
+            payload = orjson.dumps(create_sample_message(message_count))
+            result = client.publish(args.topic, payload, qos=1)
+            if result.rc != 0:
+                logger.error(
+                    f"Failed to send message {message_count} with status {result.rc}"
+                )
+                return 1
+
+            next_tick = next_deadline(next_tick, args.interval)
+            sleep_until(next_tick)
+
+        userdata["done"].wait(args.timeout)
+        logger.info(f"Received {userdata['delivered']} of {args.count} messages")
+
+    except KeyboardInterrupt:
+        logger.info("Loopback test terminated by user")
+    finally:
+        try:
+            client.loop_stop()
+            client.disconnect()
+        except Exception as e:
+            logger.error(f"Disconnect failed: {e}")
+            pass
+        logger.info("Disconnected from broker")
+
+    return 0 if userdata["delivered"] >= args.count else 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -5,14 +5,19 @@ MQTT Publisher with TLS/SSL Certificate Authentication
 A secure MQTT publisher that sends messages to a specified topic
 using TLS/SSL encryption and certificate-based authentication.
 """
-import paho.mqtt.client as mqtt
 import time
-import json
-import random
+import orjson
+import itertools
+import threading
 import argparse
+import functools
 import logging
 import os
-import ssl
+from dataclasses import dataclass
+
+from _connection import make_client_id, on_socket_open
+
+# paho-mqtt and _certs (ssl) are imported lazily, see the import test
 
 # Configure logging
 logging.basicConfig(
@@ -25,10 +30,46 @@ DEFAULT_BROKER = "localhost"
 DEFAULT_PORT = 8883  # Standard MQTT TLS port
 DEFAULT_TOPIC = "kobayashi/signals/test"
 DEFAULT_INTERVAL = 10  # seconds
-
-
-def parse_arguments():
-    """Parse command line arguments."""
+DEFAULT_LOG_EVERY = 100
+DEFAULT_INFLIGHT = 1000
+DEFAULT_QUEUE_SIZE = 0  # unlimited
+DEFAULT_ONESHOT_TIMEOUT = 10  # seconds
+
+# Possible status values for sample messages
+_STATUSES = ("green", "yellow", "red")
+
+# Sample values are drawn from pools that are refilled in bulk, which is
+# cheaper than calling into the random module for every message
+_POOL_SIZE = 1 << 16
+_POOL_MASK = _POOL_SIZE - 1
+_pool = None  # (values, statuses), replaced as a whole on every refill
+_pool_lock = threading.Lock()
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Publisher settings parsed from the command line."""
+
+    broker: str
+    port: int
+    topic: str
+    interval: float
+    batch: int
+    qos: int
+    clients: int
+    inflight: int
+    queue_size: int
+    oneshot: int | None
+    log_every: int
+    ca_cert: str
+    cert: str
+    key: str
+    debug: bool
+
+
+@functools.lru_cache(maxsize=1)
+def _parser():
+    """Build the command line parser."""
     parser = argparse.ArgumentParser(description="MQTT Publisher with TLS/SSL")
     parser.add_argument(
         "--broker",
@@ -52,6 +93,60 @@ def parse_arguments():
         default=DEFAULT_INTERVAL,
         help=f"Publish interval in seconds (default: {DEFAULT_INTERVAL})",
     )
+    parser.add_argument(
+        "--batch",
+        type=int,
+        default=1,
+        help="Number of messages to send per publish as a JSON array (default: 1)",
+    )
+    parser.add_argument(
+        "--qos",
+        type=int,
+        choices=(0, 1, 2),
+        default=1,
+        help="QoS level to publish with (default: 1)",
+    )
+    parser.add_argument(
+        "--clients",
+        type=int,
+        default=1,
+        help="Number of parallel client connections to publish from (default: 1)",
+    )
+    parser.add_argument(
+        "--inflight",
+        type=int,
+        default=DEFAULT_INFLIGHT,
+        help=(
+            "Maximum unacknowledged QoS 1/2 messages per client; higher values "
+            "raise throughput but hold more messages in memory "
+            f"(default: {DEFAULT_INFLIGHT})"
+        ),
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help=(
+            "Maximum messages queued behind the in-flight window per client, "
+            f"0 for unlimited (default: {DEFAULT_QUEUE_SIZE})"
+        ),
+    )
+    parser.add_argument(
+        "--oneshot",
+        type=int,
+        metavar="N",
+        help=(
+            "Publish N messages over a single connection as fast as the "
+            "in-flight window allows, then exit; --batch, --qos, --inflight and "
+            "--queue-size apply, --interval is ignored and --clients must be 1"
+        ),
+    )
+    parser.add_argument(
+        "--log-every",
+        type=int,
+        default=DEFAULT_LOG_EVERY,
+        help=f"Log every Nth successful publish (default: {DEFAULT_LOG_EVERY})",
+    )
     parser.add_argument(
         "--ca-cert",
         default=os.path.join("certs", "ca", "ca.crt"),
@@ -69,13 +164,23 @@ def parse_arguments():
     )
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
 
-    return parser.parse_args()
+    return parser
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    return Config(**vars(_parser().parse_args()))
 
 
 def on_connect(client, userdata, flags, reason_code, properties=None):
     """Callback when the client connects to the broker."""
     if reason_code == 0:
         logger.info(f"Connected to MQTT Broker: {userdata['broker']} using TLS/SSL")
+        from _certs import remember_tls_session
+
+        logger.debug(f"TLS session reused: {client.socket().session_reused}")
+        remember_tls_session(client)
+        userdata["connected"].set()
     else:
         logger.error(f"Failed to connect, return code: {reason_code}")
 
@@ -85,7 +190,7 @@ def on_publish(client, userdata, mid, reason_code=None, properties=None):
     logger.debug(f"Message {mid} published successfully")
 
 
-def on_disconnect(client, userdata, reason_code, properties=None):
+def on_disconnect(client, userdata, flags, reason_code, properties=None):
     """Callback when the client disconnects from the broker."""
     if reason_code == 0:
         logger.info("Disconnected successfully")
@@ -93,110 +198,319 @@ def on_disconnect(client, userdata, reason_code, properties=None):
         logger.warning(f"Unexpected disconnection, reason code: {reason_code}")
 
 
+def _refill_pool():
+    """Replace the sample pool with freshly drawn values and statuses."""
+    global _pool
+    import random
+
+    values = random.choices(range(101), k=_POOL_SIZE)
+    statuses = random.choices(_STATUSES, k=_POOL_SIZE)
+    # Publish both lists in one assignment, so parallel clients never see
+    # one refilled and the other still empty
+    _pool = (values, statuses)
+    return _pool
+
+
 def create_sample_message(message_count):
     """Create a sample message with random values."""
+    idx = message_count & _POOL_MASK
+    pool = _pool
+    if pool is None:
+        # Client threads start together; only the first one draws the pool
+        with _pool_lock:
+            pool = _pool or _refill_pool()
+    elif idx == 0:
+        # Draw fresh values each time the message count wraps around the pool
+        pool = _refill_pool()
+    values, statuses = pool
     return {
         "message_id": message_count,
-        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-        "value": random.randint(0, 100),
-        "status": random.choice(["green", "yellow", "red"]),
+        "ts": time.time_ns(),
+        "value": values[idx],
+        "status": statuses[idx],
     }
 
 
-def check_cert_files(ca_cert, client_cert, client_key):
-    """Check if certificate files exist and are readable."""
-    for cert_file in [ca_cert, client_cert, client_key]:
-        if not os.path.isfile(cert_file):
-            logger.error(f"Certificate file not found: {cert_file}")
-            return False
-        if not os.access(cert_file, os.R_OK):
-            logger.error(f"Certificate file not readable: {cert_file}")
-            return False
-    return True
+def next_deadline(deadline, interval):
+    """Advance a publish deadline by one interval.
+
+    If the loop has fallen more than an interval behind (after a stall or
+    suspend), the schedule restarts from now instead of publishing back to
+    back until it catches up.
+    """
+    deadline += interval
+    now = time.monotonic()
+    return now if now - deadline > interval else deadline
+
+
+def sleep_until(deadline, stop=None):
+    """Sleep until the given time.monotonic() deadline, or until stop is set."""
+    while stop is None or not stop.is_set():
+        delay = deadline - time.monotonic()
+        if delay <= 0:
+            return
+        if delay < 1e-3:
+            # Below the OS sleep granularity, yield instead of oversleeping
+            time.sleep(0)
+        elif stop is None:
+            time.sleep(delay)
+        else:
+            stop.wait(delay)
+
+
+def publish_oneshot(args, timeout=DEFAULT_ONESHOT_TIMEOUT):
+    """Publish a fixed number of messages over one connection, then disconnect.
+
+    Every message is handed to paho up front, so QoS 1/2 acknowledgements
+    overlap up to the --inflight limit instead of costing one round trip each.
+    The run fails if connecting, or any wait for the next publish to
+    complete, takes longer than timeout seconds.
+    """
+    client = make_client(args, 0)
+    if client is None:
+        return 1
 
+    try:
+        if not client.user_data_get()["connected"].wait(timeout):
+            logger.error(f"Not connected after {timeout} seconds")
+            return 1
+
+        logger.info(f"Publishing {args.oneshot} messages...")
+        results = []
+        for first in range(1, args.oneshot + 1, args.batch):
+            last = min(first + args.batch, args.oneshot + 1)
+            messages = [create_sample_message(i) for i in range(first, last)]
+            payload = orjson.dumps(messages[0] if args.batch == 1 else messages)
+            results.append(client.publish(args.topic, payload, qos=args.qos))
+
+        failed = 0
+        for result in results:
+            if result.rc != 0:
+                failed += 1
+                continue
+            # Bounded so a dropped connection cannot stall the run forever
+            result.wait_for_publish(timeout)
+            if not result.is_published():
+                logger.error(f"Publish not completed after {timeout} seconds")
+                return 1
+
+        if failed:
+            logger.error(f"Failed to send {failed} of {len(results)} publishes")
+            return 1
+
+        logger.info(f"Sent {args.oneshot} messages")
+        return 0
 
-def main():
-    """Main function."""
-    args = parse_arguments()
+    except KeyboardInterrupt:
+        logger.info("Publisher terminated by user")
+        return 1
+    except Exception as e:
+        logger.error(f"Error: {e}")
+        return 1
+    finally:
+        try:
+            client.loop_stop()
+            client.disconnect()
+        except Exception as e:
+            logger.error(f"Disconnect failed: {e}")
+            pass
+        logger.info("Disconnected from broker")
 
-    if args.debug:
-        logger.setLevel(logging.DEBUG)
 
-    if not check_cert_files(args.ca_cert, args.cert, args.key):
-        return 1
+def make_client(args, idx):
+    """Create a client, connect it to the broker and start its network loop.
+
+    Returns None if the TLS setup or the connection fails.
+    """
+    import paho.mqtt.client as mqtt
+
+    from _certs import build_ssl_context
 
-    # Create a client ID with a random component
-    client_id = f"kobayashi-publisher-{random.randint(0, 1000)}"
+    client_id = make_client_id("publisher", idx)
 
     # Create a client instance with version 2 callback API
     client = mqtt.Client(
         client_id=client_id,
         callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
-        userdata={"broker": args.broker},
+        userdata={"broker": args.broker, "connected": threading.Event()},
     )
 
     # Set callbacks
     client.on_connect = on_connect
     client.on_publish = on_publish
     client.on_disconnect = on_disconnect
+    client.on_socket_open = on_socket_open
+
+    # paho only allows 20 QoS 1/2 messages in flight by default, which caps
+    # throughput at one PUBACK round-trip per 20 messages
+    client.max_inflight_messages_set(args.inflight)
+    client.max_queued_messages_set(args.queue_size)
 
     logger.info("Setting up TLS/SSL with certificate authentication")
     try:
-        client.tls_set(
-            ca_certs=args.ca_cert,
-            certfile=args.cert,
-            keyfile=args.key,
-            cert_reqs=ssl.CERT_REQUIRED,
-            tls_version=ssl.PROTOCOL_TLS,
-            ciphers=None,  # defaults
-        )
+        client.tls_set_context(build_ssl_context(args.ca_cert, args.cert, args.key))
     except Exception as e:
         logger.error(f"Failed to set up TLS: {e}")
-        return 1
+        return None
 
     logger.info(f"Connecting to secure broker {args.broker}:{args.port}...")
     try:
         client.connect(args.broker, args.port)
     except Exception as e:
         logger.error(f"Connection failed: {e}")
-        return 1
+        return None
 
     # Start the MQTT loop in a non-blocking way
     client.loop_start()
 
-    try:
-        # Publish messages at regular intervals
-        message_count = 0
-        while True:
-            message_count += 1
+    return client
+
 
-            message = create_sample_message(message_count)
+def run_publisher(client, args, counter, stop):
+    """Publish messages at regular intervals until stop is set.
 
-            payload = json.dumps(message)
+    Message IDs are drawn from the shared counter so they stay unique
+    across parallel clients. Logged counts are per client and carry the
+    thread name, so parallel clients can be told apart.
+    """
+    # Bind everything the loop touches to locals once, so each iteration
+    # uses fast local lookups instead of repeated global and attribute ones
+    batch, topic, qos = args.batch, args.topic, args.qos
+    interval, log_every = args.interval, args.log_every
+    publish = client.publish
+    dumps = orjson.dumps
+    make_message = create_sample_message
+    log_info = logger.info
+    log_error = logger.error
+    stopped = stop.is_set
+    name = threading.current_thread().name
 
-            # Publish message with QoS 1 for reliability
-            result = client.publish(args.topic, payload, qos=1)
+    try:
+        publish_count = 0
+        # Schedule publishes against a monotonic deadline so the publish
+        # cost does not add drift to the interval
+        next_tick = time.monotonic()
+        while not stopped():
+            messages = [make_message(next(counter)) for _ in range(batch)]
+
+            # A single message is sent as a JSON object, a batch as an array.
+            # orjson serializes straight to bytes, which paho sends as-is
+            payload = dumps(messages[0] if batch == 1 else messages)
+
+            result = publish(topic, payload, qos=qos)
 
             # Check if the message was published
             status = result[0]
             if status == 0:
-                logger.info(f"Sent message: {payload}")
+                publish_count += 1
+                # Only format and log every Nth publish to keep the loop cheap
+                if publish_count % log_every == 0:
+                    log_info(
+                        f"{name}: sent {publish_count * batch} messages, "
+                        f"latest: {payload.decode()}"
+                    )
             else:
-                logger.error(f"Failed to send message with status {status}")
+                log_error(f"{name}: failed to send message with status {status}")
+
+            next_tick = next_deadline(next_tick, interval)
+            sleep_until(next_tick, stop)
+
+    except Exception as e:
+        logger.error(f"{name}: error: {e}")
+
+
+def check_arguments(args):
+    """Check that the parsed arguments are usable together."""
+    if args.batch < 1:
+        logger.error(f"Batch size must be at least 1, got: {args.batch}")
+        return False
 
-            time.sleep(args.interval)
+    if args.clients < 1:
+        logger.error(f"Client count must be at least 1, got: {args.clients}")
+        return False
 
+    if args.inflight < 1:
+        logger.error(f"In-flight limit must be at least 1, got: {args.inflight}")
+        return False
+
+    if args.queue_size < 0:
+        logger.error(f"Queue size must not be negative, got: {args.queue_size}")
+        return False
+
+    if args.log_every < 1:
+        logger.error(f"Log interval must be at least 1, got: {args.log_every}")
+        return False
+
+    if args.oneshot is not None and args.oneshot < 1:
+        logger.error(f"Oneshot count must be at least 1, got: {args.oneshot}")
+        return False
+
+    if args.oneshot is not None and args.clients != 1:
+        logger.error("--oneshot publishes over a single connection, drop --clients")
+        return False
+
+    return True
+
+
+def main():
+    """Main function."""
+    from _certs import check_cert_files
+
+    args = parse_arguments()
+
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+
+    if not check_cert_files(args.ca_cert, args.cert, args.key):
+        return 1
+
+    if not check_arguments(args):
+        return 1
+
+    if args.oneshot:
+        return publish_oneshot(args)
+
+    # Each client gets its own socket and network loop, so their in-flight
+    # QoS 1 windows overlap instead of queueing behind one connection
+    clients = []
+    for idx in range(args.clients):
+        client = make_client(args, idx)
+        if client is None:
+            for client in clients:
+                client.loop_stop()
+                client.disconnect()
+            return 1
+        clients.append(client)
+
+    counter = itertools.count(1)
+    stop = threading.Event()
+    threads = [
+        threading.Thread(
+            target=run_publisher,
+            args=(client, args, counter, stop),
+            name=f"publisher-{idx}",
+        )
+        for idx, client in enumerate(clients)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for thread in threads:
+            thread.join()
     except KeyboardInterrupt:
         logger.info("Publisher terminated by user")
-    except Exception as e:
-        logger.error(f"Error: {e}")
     finally:
-        try:
-            client.loop_stop()
-            client.disconnect()
-        except Exception as e:
-            logger.error(f"Disconnect failed: {e}")
-            pass
+        stop.set()
+        for thread in threads:
+            thread.join()
+        for client in clients:
+            try:
+                client.loop_stop()
+                client.disconnect()
+            except Exception as e:
+                logger.error(f"Disconnect failed: {e}")
+                pass
         logger.info("Disconnected from broker")
 
     return 0
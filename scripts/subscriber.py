@@ -5,14 +5,20 @@ MQTT Subscriber with TLS/SSL Certificate Authentication
 A secure MQTT subscriber that receives messages from a specified topic
 using TLS/SSL encryption and certificate-based authentication.
 """
-import paho.mqtt.client as mqtt
-import random
-import json
 import argparse
+import functools
+import itertools
 import logging
 import os
-import ssl
-from datetime import datetime
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Union
+
+import msgspec
+
+from _connection import make_client_id, on_socket_open
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -23,10 +29,43 @@ logger = logging.getLogger("MQTT-Subscriber")
 DEFAULT_BROKER = "localhost"
 DEFAULT_PORT = 8883  # Standard MQTT TLS port
 DEFAULT_TOPIC = "kobayashi/signals/test"
+DEFAULT_LOG_EVERY = 100
+DEFAULT_WORKERS = 1
+DEFAULT_HANDLER_QUEUE = 10_000
 
 
-def parse_arguments():
-    """Parse command line arguments."""
+class Signal(msgspec.Struct):
+    """A sample message sent by the publisher."""
+
+    message_id: int
+    ts: int  # Publish time in nanoseconds since the epoch
+    value: int
+    status: str
+
+
+# Batched publishes carry a JSON array of messages
+_decoder = msgspec.json.Decoder(Union[Signal, list[Signal]])
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Subscriber settings parsed from the command line."""
+
+    broker: str
+    port: int
+    topic: str
+    log_every: int
+    workers: int
+    handler_queue: int
+    ca_cert: str
+    cert: str
+    key: str
+    debug: bool
+
+
+@functools.lru_cache(maxsize=1)
+def _parser():
+    """Build the command line parser."""
     parser = argparse.ArgumentParser(description="MQTT Subscriber with TLS/SSL")
     parser.add_argument(
         "--broker",
@@ -44,6 +83,29 @@ def parse_arguments():
         default=DEFAULT_TOPIC,
         help=f"MQTT topic to subscribe to (default: {DEFAULT_TOPIC})",
     )
+    parser.add_argument(
+        "--log-every",
+        type=int,
+        default=DEFAULT_LOG_EVERY,
+        help=f"Log every Nth received message (default: {DEFAULT_LOG_EVERY})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Number of message handling threads (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--handler-queue",
+        type=int,
+        default=DEFAULT_HANDLER_QUEUE,
+        help=(
+            "Maximum messages waiting for a handler thread, at least 1. "
+            "Messages arriving while it is full are dropped, including QoS 1 "
+            "messages the broker already considers delivered "
+            f"(default: {DEFAULT_HANDLER_QUEUE})"
+        ),
+    )
     parser.add_argument(
         "--ca-cert",
         default=os.path.join("certs", "ca", "ca.crt"),
@@ -61,13 +123,22 @@ def parse_arguments():
     )
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
 
-    return parser.parse_args()
+    return parser
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    return Config(**vars(_parser().parse_args()))
 
 
 def on_connect(client, userdata, flags, reason_code, properties=None):
     """Callback when the client connects to the broker."""
     if reason_code == 0:
         logger.info(f"Connected to MQTT Broker: {userdata['broker']} using TLS/SSL")
+        from _certs import remember_tls_session
+
+        logger.debug(f"TLS session reused: {client.socket().session_reused}")
+        remember_tls_session(client)
         # Subscribe to the topic upon successful connection
         client.subscribe(userdata["topic"], qos=1)
         logger.info(f"Subscribed to topic: {userdata['topic']}")
@@ -76,48 +147,104 @@ def on_connect(client, userdata, flags, reason_code, properties=None):
 
 
 def on_subscribe(client, userdata, mid, reason_code_list=None, properties=None):
-    """Callback when client subscribes to a topic."""
+    """Callback when client subscribes to a topic.
+
+    Returns whether every subscription was granted, for callers that wrap it.
+    """
     logger.debug(f"Subscribed with message ID: {mid}")
-    if reason_code_list:
-        for idx, reason_code in enumerate(reason_code_list):
-            if reason_code != 0:
-                logger.warning(
-                    f"Failed to subscribe to topic #{idx}, reason code: {reason_code}"
+    granted = True
+    for idx, reason_code in enumerate(reason_code_list or ()):
+        # A granted QoS 1 or 2 is reported as reason code 1 or 2, so only
+        # actual failures count
+        if reason_code.is_failure:
+            logger.warning(
+                f"Failed to subscribe to topic #{idx}, reason code: {reason_code}"
+            )
+            granted = False
+    return granted
+
+
+def process_message(topic, payload, userdata):
+    """Decode and log a received payload."""
+    try:
+        decoded = _decoder.decode(payload)
+
+        signals = decoded if isinstance(decoded, list) else [decoded]
+
+        # Resolve the log levels once per payload rather than once per message
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        info_enabled = logger.isEnabledFor(logging.INFO)
+        log_every = userdata["log_every"]
+        received_counter = userdata["received"]
+        red_counter = userdata["red"]
+
+        for signal in signals:
+            # Only read the clock and format when the record will be emitted
+            if debug_enabled:
+                logger.debug(
+                    "Message %d on %s: value=%s status=%s latency=%.1fms",
+                    signal.message_id,
+                    topic,
+                    signal.value,
+                    signal.status,
+                    (time.time_ns() - signal.ts) / 1e6,
                 )
 
+            received = next(received_counter)
+            if info_enabled and received % log_every == 0:
+                latency_ms = (time.time_ns() - signal.ts) / 1e6
+                logger.info(
+                    f"Received {received} messages, latest latency: {latency_ms:.1f} ms"
+                )
+
+            # About one message in three is red, so only every Nth is logged
+            if signal.status == "red":
+                red = next(red_counter)
+                if red == 1 or red % log_every == 0:
+                    logger.warning(f"ALERT: Red status detected ({red} so far)")
+
+    except msgspec.DecodeError as e:
+        # Covers both malformed JSON and messages with missing or mistyped keys
+        logger.error(f"Error decoding message: {e}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Raw message: {payload}")
+    except Exception as e:
+        logger.error(f"Error processing message: {e}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Raw message: {payload}")
+
 
 def on_message(client, userdata, msg):
-    """Callback when a message is received."""
-    try:
-        payload_str = msg.payload.decode("utf-8")
+    """Callback when a message is received.
 
-        message = json.loads(payload_str)
+    Only queues the payload, so decoding and logging never hold up the
+    network loop.
+    """
+    try:
+        userdata["queue"].put_nowait((msg.topic, msg.payload))
+    except queue.Full:
+        count_dropped(userdata)
 
-        # Get current time for latency calculation
-        receive_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        logger.info(f"\n--- New Message Received on {msg.topic} ---")
-        logger.info(f"Message ID: {message['message_id']}")
-        logger.info(f"Message timestamp: {message['timestamp']}")
-        logger.info(f"Received at: {receive_time}")
-        logger.info(f"Value: {message['value']}")
-        logger.info(f"Status: {message['status']}")
+def count_dropped(userdata):
+    """Count a message dropped on a full queue, logging every Nth drop."""
+    userdata["dropped"] += 1
+    dropped = userdata["dropped"]
+    if dropped == 1 or dropped % userdata["log_every"] == 0:
+        logger.warning(f"Message queue full, dropped {dropped} messages")
 
-        if message["status"] == "red":
-            logger.warning("ALERT: Red status detected!")
 
-    except json.JSONDecodeError:
-        logger.error("Error decoding JSON message")
-        logger.debug(f"Raw message: {payload_str}")
-    except KeyError as e:
-        logger.error(f"Missing expected key in message: {e}")
-        logger.debug(f"Message content: {message}")
-    except Exception as e:
-        logger.error(f"Error processing message: {e}")
-        logger.debug(f"Raw message: {msg.payload}")
+def process_queue(userdata):
+    """Worker thread loop that handles queued messages."""
+    # Bind the queue and handler to locals once for the lifetime of the loop
+    get = userdata["queue"].get
+    handle = process_message
+    while True:
+        topic, payload = get()
+        handle(topic, payload, userdata)
 
 
-def on_disconnect(client, userdata, reason_code, properties=None):
+def on_disconnect(client, userdata, flags, reason_code, properties=None):
     """Callback when the client disconnects from the broker."""
     if reason_code == 0:
         logger.info("Disconnected successfully")
@@ -125,20 +252,12 @@ def on_disconnect(client, userdata, reason_code, properties=None):
         logger.warning(f"Unexpected disconnection, reason code: {reason_code}")
 
 
-def check_cert_files(ca_cert, client_cert, client_key):
-    """Check if certificate files exist and are readable."""
-    for cert_file in [ca_cert, client_cert, client_key]:
-        if not os.path.isfile(cert_file):
-            logger.error(f"Certificate file not found: {cert_file}")
-            return False
-        if not os.access(cert_file, os.R_OK):
-            logger.error(f"Certificate file not readable: {cert_file}")
-            return False
-    return True
-
-
 def main():
     """Main function."""
+    import paho.mqtt.client as mqtt
+
+    from _certs import build_ssl_context, check_cert_files
+
     args = parse_arguments()
 
     if args.debug:
@@ -147,11 +266,42 @@ def main():
     if not check_cert_files(args.ca_cert, args.cert, args.key):
         return 1
 
-    # Create a client ID with a random component
-    client_id = f"kobayashi-subscriber-{random.randint(0, 1000)}"
+    if args.log_every < 1:
+        logger.error(f"Log interval must be at least 1, got: {args.log_every}")
+        return 1
+
+    if args.workers < 1:
+        logger.error(f"Worker count must be at least 1, got: {args.workers}")
+        return 1
+
+    # Queue(maxsize=0) would be unbounded rather than empty
+    if args.handler_queue < 1:
+        logger.error(
+            f"Handler queue size must be at least 1, got: {args.handler_queue}"
+        )
+        return 1
+
+    client_id = make_client_id("subscriber")
 
     # Store topic in userdata for access in callbacks
-    userdata = {"topic": args.topic, "broker": args.broker}
+    userdata = {
+        "topic": args.topic,
+        "broker": args.broker,
+        "log_every": args.log_every,
+        # itertools.count keeps the tally consistent across worker threads
+        "received": itertools.count(1),
+        "red": itertools.count(1),
+        "queue": queue.Queue(maxsize=args.handler_queue),
+        "dropped": 0,
+    }
+
+    for idx in range(args.workers):
+        threading.Thread(
+            target=process_queue,
+            args=(userdata,),
+            name=f"subscriber-worker-{idx}",
+            daemon=True,
+        ).start()
 
     # Create a client instance with version 2 callback API
     client = mqtt.Client(
@@ -165,17 +315,11 @@ def main():
     client.on_message = on_message
     client.on_subscribe = on_subscribe
     client.on_disconnect = on_disconnect
+    client.on_socket_open = on_socket_open
 
     logger.info("Setting up TLS/SSL with certificate authentication")
     try:
-        client.tls_set(
-            ca_certs=args.ca_cert,
-            certfile=args.cert,
-            keyfile=args.key,
-            cert_reqs=ssl.CERT_REQUIRED,
-            tls_version=ssl.PROTOCOL_TLS,
-            ciphers=None,
-        )
+        client.tls_set_context(build_ssl_context(args.ca_cert, args.cert, args.key))
     except Exception as e:
         logger.error(f"Failed to set up TLS: {e}")
         return 1
@@ -202,6 +346,8 @@ def main():
             logger.error(f"Disconnect failed: {e}")
             pass
         logger.info("Disconnected from broker")
+        if userdata["dropped"]:
+            logger.warning(f"Dropped {userdata['dropped']} messages in total")
 
     return 0
 
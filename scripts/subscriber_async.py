@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Asyncio MQTT Subscriber with TLS/SSL Certificate Authentication
+---------------------------------------------------------------
+An asyncio variant of the subscriber built on aiomqtt. The event loop keeps
+reading from the socket while received messages are handled on a pool of
+worker threads, so slow message handling does not stall network reads.
+"""
+
+import asyncio
+import functools
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import aiomqtt
+
+import subscriber
+from _certs import build_ssl_context, check_cert_files, remember_tls_session
+from _connection import SOCKET_OPTIONS, make_client_id
+from subscriber import count_dropped, parse_arguments, process_message
+
+logger = logging.getLogger("MQTT-Subscriber-Async")
+
+RECONNECT_INTERVAL = 5  # seconds
+
+
+class _DroppingQueue(asyncio.Queue):
+    """Incoming message queue that counts messages dropped while it is full."""
+
+    def __init__(self, maxsize=0, userdata=None):
+        super().__init__(maxsize)
+        self.userdata = userdata
+
+    def put_nowait(self, item):
+        try:
+            super().put_nowait(item)
+        except asyncio.QueueFull:
+            count_dropped(self.userdata)
+
+
+def _handled(future):
+    """Log a handler failure that process_message did not catch itself."""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Error handling message: {future.exception()}")
+
+
+async def subscribe(args, userdata):
+    """Connect to the broker and dispatch received messages until cancelled.
+
+    Messages are handled on --workers threads. While all of them are busy,
+    new messages wait in aiomqtt's incoming queue, which holds at most
+    --handler-queue messages and drops the rest. Lost connections are retried
+    every RECONNECT_INTERVAL seconds, resuming the last TLS session.
+    """
+    client_id = make_client_id("subscriber")
+
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(args.workers)
+    connected = False
+
+    def release(future):
+        slots.release()
+        _handled(future)
+
+    with ThreadPoolExecutor(
+        max_workers=args.workers, thread_name_prefix="subscriber-worker"
+    ) as executor:
+        while True:
+            logger.info(f"Connecting to secure broker {args.broker}:{args.port}...")
+            try:
+                async with aiomqtt.Client(
+                    hostname=args.broker,
+                    port=args.port,
+                    identifier=client_id,
+                    tls_context=build_ssl_context(args.ca_cert, args.cert, args.key),
+                    socket_options=SOCKET_OPTIONS,
+                    max_queued_incoming_messages=args.handler_queue,
+                    queue_type=functools.partial(_DroppingQueue, userdata=userdata),
+                ) as client:
+                    connected = True
+                    # aiomqtt does not expose the paho client it wraps
+                    paho_client = client._client
+                    logger.debug(
+                        f"TLS session reused: {paho_client.socket().session_reused}"
+                    )
+                    remember_tls_session(paho_client)
+                    logger.info(
+                        f"Connected to MQTT Broker: {args.broker} using TLS/SSL"
+                    )
+                    await client.subscribe(args.topic, qos=1)
+                    logger.info(f"Subscribed to topic: {args.topic}")
+
+                    async for message in client.messages:
+                        await slots.acquire()
+                        future = loop.run_in_executor(
+                            executor,
+                            process_message,
+                            message.topic.value,
+                            message.payload,
+                            userdata,
+                        )
+                        future.add_done_callback(release)
+            except aiomqtt.MqttError as e:
+                # Only retry once a connection has worked, so bad settings
+                # still fail fast
+                if not connected:
+                    raise
+                logger.warning(
+                    f"Connection lost: {e}, reconnecting in {RECONNECT_INTERVAL} seconds"
+                )
+                await asyncio.sleep(RECONNECT_INTERVAL)
+
+
+def main():
+    """Main function."""
+    args = parse_arguments()
+
+    if args.debug:
+        logger.setLevel(logging.DEBUG)
+        subscriber.logger.setLevel(logging.DEBUG)
+
+    if not check_cert_files(args.ca_cert, args.cert, args.key):
+        return 1
+
+    if args.log_every < 1:
+        logger.error(f"Log interval must be at least 1, got: {args.log_every}")
+        return 1
+
+    if args.workers < 1:
+        logger.error(f"Worker count must be at least 1, got: {args.workers}")
+        return 1
+
+    # aiomqtt treats a queue size of 0 as unbounded
+    if args.handler_queue < 1:
+        logger.error(
+            f"Handler queue size must be at least 1, got: {args.handler_queue}"
+        )
+        return 1
+
+    userdata = {
+        "log_every": args.log_every,
+        "received": itertools.count(1),
+        "red": itertools.count(1),
+        "dropped": 0,
+    }
+
+    logger.info("Waiting for messages. Press Ctrl+C to exit.")
+    try:
+        asyncio.run(subscribe(args, userdata))
+    except KeyboardInterrupt:
+        logger.info("Subscriber terminated by user")
+    except aiomqtt.MqttError as e:
+        logger.error(f"Connection failed: {e}")
+        return 1
+
+    logger.info("Disconnected from broker")
+    if userdata["dropped"]:
+        logger.warning(f"Dropped {userdata['dropped']} messages in total")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -16,6 +16,20 @@ def test_mqtt_modules_import():
     assert callable(sub_parse)
 
 
+def test_mqtt_modules_import_lazily():
+    """Test that importing the client modules does not load paho, ssl or random."""
+    import subprocess
+
+    scripts_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../scripts"))
+    code = (
+        "import sys; import publisher, subscriber; "
+        "assert 'paho.mqtt.client' not in sys.modules; "
+        "assert 'ssl' not in sys.modules; "
+        "assert 'random' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=scripts_dir, check=True)
+
+
 def test_publisher_argument_parsing():
     """Test the argument parsing in the publisher."""
     from publisher import parse_arguments
@@ -32,6 +46,45 @@ def test_publisher_argument_parsing():
         sys.argv = original_argv
 
 
+def test_publisher_throughput_arguments():
+    """Test the batching, QoS and client count arguments in the publisher."""
+    from publisher import parse_arguments
+    import sys
+
+    original_argv = sys.argv
+
+    try:
+        sys.argv = ["publisher.py", "--batch", "50", "--qos", "0", "--clients", "4"]
+        args = parse_arguments()
+        assert args.batch == 50
+        assert args.qos == 0
+        assert args.clients == 4
+    finally:
+        sys.argv = original_argv
+
+
+def test_publisher_oneshot_arguments():
+    """Test the oneshot argument and its checks in the publisher."""
+    from publisher import check_arguments, parse_arguments
+    import sys
+
+    original_argv = sys.argv
+
+    try:
+        sys.argv = ["publisher.py", "--oneshot", "10", "--batch", "5"]
+        args = parse_arguments()
+        assert args.oneshot == 10
+        assert check_arguments(args)
+
+        sys.argv = ["publisher.py", "--oneshot", "0"]
+        assert not check_arguments(parse_arguments())
+
+        sys.argv = ["publisher.py", "--oneshot", "10", "--clients", "2"]
+        assert not check_arguments(parse_arguments())
+    finally:
+        sys.argv = original_argv
+
+
 def test_subscriber_argument_parsing():
     """Test the argument parsing in the subscriber."""
     from subscriber import parse_arguments
@@ -46,3 +99,171 @@ def test_subscriber_argument_parsing():
         assert args.topic == "test/topic"
     finally:
         sys.argv = original_argv
+
+
+def test_publisher_sample_message():
+    """Test that sample messages serialize to the expected JSON shape."""
+    import orjson
+    from publisher import create_sample_message
+
+    message = orjson.loads(orjson.dumps(create_sample_message(7)))
+    assert message["message_id"] == 7
+    assert isinstance(message["ts"], int)
+    assert 0 <= message["value"] <= 100
+    assert message["status"] in ("green", "yellow", "red")
+
+
+def test_publisher_sample_pool_threads(monkeypatch):
+    """Test that client threads starting together share one sample pool."""
+    import threading
+    from unittest import mock
+    import publisher
+
+    monkeypatch.setattr(publisher, "_pool", None)
+    errors = []
+
+    def create(message_count):
+        try:
+            publisher.create_sample_message(message_count)
+        except Exception as e:
+            errors.append(e)
+
+    with mock.patch.object(
+        publisher, "_refill_pool", wraps=publisher._refill_pool
+    ) as refill:
+        threads = [threading.Thread(target=create, args=(i,)) for i in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert not errors
+    assert refill.call_count == 1
+
+
+def test_publisher_sleep_until():
+    """Test that sleep_until waits for the deadline and skips past ones."""
+    import time
+    from publisher import sleep_until
+
+    deadline = time.monotonic() + 0.01
+    sleep_until(deadline)
+    assert time.monotonic() >= deadline
+
+    start = time.monotonic()
+    sleep_until(start - 1)
+    assert time.monotonic() - start < 0.01
+
+
+def test_publisher_next_deadline():
+    """Test that deadlines advance by the interval but never burst to catch up."""
+    import time
+    from publisher import next_deadline
+
+    now = time.monotonic()
+    assert next_deadline(now, 10) == now + 10
+
+    stalled = now - 60
+    assert next_deadline(stalled, 1) >= now
+
+
+def test_subscriber_decodes_batches():
+    """Test that the subscriber decodes single messages and batches."""
+    import orjson
+    from publisher import create_sample_message
+    from subscriber import Signal, _decoder
+
+    single = _decoder.decode(orjson.dumps(create_sample_message(1)))
+    assert isinstance(single, Signal)
+    assert single.message_id == 1
+
+    batch = _decoder.decode(
+        orjson.dumps([create_sample_message(2), create_sample_message(3)])
+    )
+    assert [signal.message_id for signal in batch] == [2, 3]
+
+
+def test_subscriber_drops_when_queue_full():
+    """Test that the subscriber counts messages dropped on a full queue."""
+    import queue
+    from types import SimpleNamespace
+    from subscriber import on_message
+
+    userdata = {"queue": queue.Queue(maxsize=1), "dropped": 0, "log_every": 100}
+    for _ in range(3):
+        on_message(None, userdata, SimpleNamespace(topic="test/topic", payload=b"{}"))
+
+    assert userdata["queue"].qsize() == 1
+    assert userdata["dropped"] == 2
+
+
+def test_check_cert_files(tmp_path):
+    """Test that certificate checks reject missing files and directories."""
+    from _certs import check_cert_files
+
+    cert = tmp_path / "client.crt"
+    cert.write_text("cert")
+
+    assert check_cert_files(str(cert))
+    assert not check_cert_files(str(cert), str(tmp_path / "missing.key"))
+    assert not check_cert_files(str(tmp_path))
+
+
+def test_cert_readability_from_stat(tmp_path):
+    """Test that readability is decided from stat bits where they settle it."""
+    import os
+    import stat
+    from unittest import mock
+    from _certs import _is_readable
+
+    path = str(tmp_path / "client.key")
+    owner = mock.Mock(st_uid=1000, st_mode=stat.S_IFREG | 0o600)
+    locked = mock.Mock(st_uid=1000, st_mode=stat.S_IFREG | 0o000)
+    public = mock.Mock(st_uid=0, st_mode=stat.S_IFREG | 0o644)
+
+    with mock.patch("os.access") as access:
+        assert _is_readable(path, owner, 1000)
+        assert not _is_readable(path, locked, 1000)
+        assert _is_readable(path, public, 1000)
+        assert _is_readable(path, locked, 0)
+        access.assert_not_called()
+
+    # Group-only permissions need os.access() to resolve group membership
+    group = mock.Mock(st_uid=0, st_mode=stat.S_IFREG | 0o640)
+    with mock.patch("os.access", return_value=False) as access:
+        assert not _is_readable(path, group, 1000)
+        access.assert_called_once_with(path, os.R_OK)
+
+
+def test_subscribe_reason_codes():
+    """Test that the subscriber and loopback test treat a granted QoS as success."""
+    import threading
+    from paho.mqtt.packettypes import PacketTypes
+    from paho.mqtt.reasoncodes import ReasonCode
+    import loopback
+    import subscriber
+
+    for code, failed in ((1, False), (0x80, True)):
+        reason_codes = [ReasonCode(PacketTypes.SUBACK, identifier=code)]
+        userdata = {
+            "topic": "test/topic",
+            "subscribed": threading.Event(),
+            "subscribe_failed": False,
+        }
+        assert subscriber.on_subscribe(None, userdata, 1, reason_codes) is not failed
+
+        loopback.on_subscribe(None, userdata, 1, reason_codes)
+        assert userdata["subscribed"].is_set()
+        assert userdata["subscribe_failed"] is failed
+
+
+def test_make_client_id():
+    """Test that client IDs carry the prefix and optional client index."""
+    from _connection import make_client_id
+
+    assert make_client_id("subscriber").startswith(
+        f"kobayashi-subscriber-{os.getpid():x}-"
+    )
+    assert make_client_id("publisher", 3).startswith(
+        f"kobayashi-publisher-3-{os.getpid():x}-"
+    )